@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+"""Loads the output API metaschema and every `<analysis>_output_API.json`."""
+
+import os
+from json import load
+
+
+_API_ENDING = "_output_API.json"
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_SCHEMA_PATH = os.path.join(_BASE_DIR, "output_API.schema.json")
+
+
+try:
+    with open(_SCHEMA_PATH, "r") as f:
+        METASCHEMA = load(f)
+except Exception as e:
+    raise Exception(f"Failed loading json {_SCHEMA_PATH}") from e
+
+OUTPUT_APIS = {}
+for dname, _, files in os.walk(_BASE_DIR):
+    for fname in files:
+        if fname.endswith(_API_ENDING):
+            analysis = fname[: -len(_API_ENDING)]
+            with open(os.path.join(dname, fname), "rb") as f:
+                OUTPUT_APIS[analysis] = load(f)
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+"""Expansion of output APIs into concrete file manifests, with a memoizing cache.
+
+An output API maps wildcard groups (e.g. "cimac id", "run id") to lists of file
+entries whose `file_path_template` contains `{wildcard}` placeholders. Expanding
+an API for a given set of wildcard bindings yields the expected files of one run.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from ._apis import OUTPUT_APIS
+
+
+CacheInfo = namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "spill_hits", "evictions", "maxsize", "currsize"],
+)
+
+_WILDCARD = re.compile(r"\{([^}]+)\}")
+_SPILL_NAME = re.compile(
+    r"^manifest-([0-9a-f]{16})-([0-9a-f]{16})-[0-9a-f]{64}\.json$"
+)
+_MAX_TRACKED_APIS = 64
+
+
+def spec_hash(api: dict) -> str:
+    """Return a stable content hash of an output API specification."""
+    payload = json.dumps(api, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _fill(template: str, values: Dict[str, str]) -> str:
+    """Replace each `{wildcard}` in `template` exactly once from `values`."""
+
+    def substitute(match):
+        name = match.group(1)
+        if name not in values:
+            raise KeyError(f"Unbound wildcard {{{name}}} in {template!r}")
+        return values[name]
+
+    return _WILDCARD.sub(substitute, template)
+
+
+def expand_manifest(api: dict, bindings: Dict[str, str]) -> List[dict]:
+    """Substitute `bindings` into every file_path_template of `api`.
+
+    Each returned entry is a copy of the API entry with an added `file_path`
+    key holding the expanded path. Raises KeyError naming the first wildcard
+    that is missing from `bindings`.
+    """
+    values = {k: str(v) for k, v in bindings.items()}
+    return [
+        dict(entry, file_path=_fill(entry["file_path_template"], values))
+        for entries in api.values()
+        for entry in entries
+    ]
+
+
+def _short_hash(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()[:16]
+
+
+def _remove(path: str):
+    """Remove a spill file, tolerating its removal by another process."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ManifestCache:
+    """Thread-safe LRU cache of expanded manifests.
+
+    Entries are keyed by (analysis, spec content hash, wildcard bindings). The
+    packaged `OUTPUT_APIS` are hashed once per cache; an `api` passed explicitly
+    is re-hashed on every call, so editing it in place is picked up and drops the
+    manifests cached for its old content. Specs whose content differs simply
+    coexist in the cache until they age out of the LRU.
+
+    Entries evicted from memory are written as JSON to `spill_dir`, if given, and
+    are read back on a later miss. The spill tier holds at most `spill_maxsize`
+    files, indexed in memory from a single listing of `spill_dir` when the cache
+    is created. Reading a spill file costs about as much as expanding a packaged
+    API, so spilling only pays off for specs that are expensive to expand.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        spill_dir: Optional[str] = None,
+        spill_maxsize: int = 1024,
+    ):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be positive, got {maxsize}")
+        if spill_maxsize < 1:
+            raise ValueError(f"spill_maxsize must be positive, got {spill_maxsize}")
+        self.maxsize = maxsize
+        self.spill_dir = spill_dir
+        self.spill_maxsize = spill_maxsize
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> Tuple[dict, ...]
+        self._packaged_digests = {}  # analysis -> spec hash of OUTPUT_APIS entry
+        self._api_digests = OrderedDict()  # id(api) -> (api, last spec hash)
+        self._spilled = OrderedDict()  # spill path -> None, oldest first
+        self._hits = self._misses = self._spill_hits = self._evictions = 0
+
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+            for path in self._index_spill():
+                self._spilled[path] = None
+
+    def get(
+        self, analysis: str, bindings: Dict[str, str], api: Optional[dict] = None
+    ) -> List[dict]:
+        """Return the expanded manifest of `analysis` for `bindings`.
+
+        `api` defaults to `OUTPUT_APIS[analysis]`. The returned entries are
+        copies and may be modified freely by the caller.
+        """
+        packaged = api is None
+        if packaged:
+            api = OUTPUT_APIS[analysis]
+            digest = self._packaged_digest(analysis, api)
+        else:
+            digest = spec_hash(api)
+
+        key = (
+            analysis,
+            digest,
+            tuple(sorted((k, str(v)) for k, v in bindings.items())),
+        )
+
+        with self._lock:
+            replaced = None if packaged else self._track_api(api, digest)
+            if replaced is not None:
+                stale = [k for k in self._entries if k[:2] == (analysis, replaced)]
+                for old_key in stale:
+                    del self._entries[old_key]
+            manifest = self._entries.get(key)
+            if manifest is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+        if manifest is not None:
+            return [dict(e) for e in manifest]
+
+        # disk I/O and expansion happen outside the lock; concurrent misses on
+        # the same key may both compute it, which is harmless
+        if replaced is not None:
+            self._sweep_spill(analysis, replaced)
+        manifest = self._read_spill(key)
+        from_spill = manifest is not None
+        if not from_spill:
+            manifest = tuple(expand_manifest(api, bindings))
+
+        with self._lock:
+            if from_spill:
+                self._spill_hits += 1
+            else:
+                self._misses += 1
+            evicted = self._store(key, manifest)
+
+        if self.spill_dir is not None:
+            for old_key, old_manifest in evicted:
+                self._write_spill(old_key, old_manifest)
+        return [dict(e) for e in manifest]
+
+    def cache_info(self) -> CacheInfo:
+        """Report hit/miss statistics, in the style of functools.lru_cache."""
+        with self._lock:
+            return CacheInfo(
+                self._hits,
+                self._misses,
+                self._spill_hits,
+                self._evictions,
+                self.maxsize,
+                len(self._entries),
+            )
+
+    def clear(self):
+        """Drop all in-memory and spilled entries and reset statistics.
+
+        Only spill files written by a ManifestCache are removed from `spill_dir`.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._api_digests.clear()
+            self._spilled.clear()
+            self._hits = self._misses = self._spill_hits = self._evictions = 0
+        for path in self._index_spill():
+            _remove(path)
+
+    def _packaged_digest(self, analysis: str, api: dict) -> str:
+        """Return the spec hash of `OUTPUT_APIS[analysis]`, computed once."""
+        digest = self._packaged_digests.get(analysis)
+        if digest is None:
+            digest = spec_hash(api)
+            self._packaged_digests[analysis] = digest
+        return digest
+
+    def _track_api(self, api: dict, digest: str) -> Optional[str]:
+        """Record the digest of `api`, returning its previous one if it changed."""
+        # keeping a reference to `api` stops its id from being reused
+        previous = self._api_digests.pop(id(api), None)
+        self._api_digests[id(api)] = (api, digest)
+        if len(self._api_digests) > _MAX_TRACKED_APIS:
+            self._api_digests.popitem(last=False)
+        if previous is not None and previous[0] is api and previous[1] != digest:
+            return previous[1]
+        return None
+
+    def _store(self, key: tuple, manifest: Tuple[dict, ...]) -> List[tuple]:
+        """Insert `manifest` and return the (key, manifest) pairs evicted."""
+        self._entries[key] = manifest
+        self._entries.move_to_end(key)
+        evicted = []
+        while len(self._entries) > self.maxsize:
+            evicted.append(self._entries.popitem(last=False))
+            self._evictions += 1
+        return evicted
+
+    def _spill_path(self, key: tuple) -> str:
+        analysis, digest, _ = key
+        name = "manifest-{}-{}-{}.json".format(
+            _short_hash(analysis),
+            digest[:16],
+            hashlib.sha256(repr(key).encode("utf-8")).hexdigest(),
+        )
+        return os.path.join(self.spill_dir, name)
+
+    def _index_spill(self) -> List[str]:
+        """List this class's spill files in `spill_dir`, oldest first."""
+        if self.spill_dir is None:
+            return []
+        aged = []
+        try:
+            for entry in os.scandir(self.spill_dir):
+                if _SPILL_NAME.match(entry.name):
+                    aged.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            pass
+        return [path for _, path in sorted(aged)]
+
+    def _sweep_spill(self, analysis: str, digest: str):
+        """Remove the indexed spill files of `analysis` written for `digest`."""
+        if self.spill_dir is None:
+            return
+        prefix = os.path.join(
+            self.spill_dir, f"manifest-{_short_hash(analysis)}-{digest[:16]}-"
+        )
+        with self._lock:
+            stale = [path for path in self._spilled if path.startswith(prefix)]
+            for path in stale:
+                del self._spilled[path]
+        for path in stale:
+            _remove(path)
+
+    def _write_spill(self, key: tuple, manifest: Tuple[dict, ...]):
+        """Write `manifest` to disk; failures are ignored as spilling is optional."""
+        path = self._spill_path(key)
+        with self._lock:
+            if path in self._spilled:
+                # spill files are never modified, so an earlier copy is still valid
+                self._spilled.move_to_end(path)
+                return
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        payload = json.dumps(
+            {"key": list(key[:2]) + [list(map(list, key[2]))], "manifest": manifest},
+            separators=(",", ":"),
+        )
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._spilled[path] = None
+            overflow = []
+            while len(self._spilled) > self.spill_maxsize:
+                overflow.append(self._spilled.popitem(last=False)[0])
+        for old_path in overflow:
+            _remove(old_path)
+
+    def _read_spill(self, key: tuple) -> Optional[Tuple[dict, ...]]:
+        if self.spill_dir is None:
+            return None
+        path = self._spill_path(key)
+        with self._lock:
+            if path not in self._spilled:
+                return None
+            self._spilled.move_to_end(path)
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            analysis, digest, bindings = data["key"]
+            stored_key = (analysis, digest, tuple(map(tuple, bindings)))
+            manifest = tuple(data["manifest"])
+        except FileNotFoundError:
+            self._forget_spill(path)
+            return None
+        except (OSError, EOFError, ValueError, KeyError, TypeError):
+            # a corrupt spill file is dropped and the manifest re-expanded
+            self._forget_spill(path)
+            _remove(path)
+            return None
+
+        # guard against hash collisions in the file name
+        if stored_key != key:
+            return None
+        return manifest
+
+    def _forget_spill(self, path: str):
+        with self._lock:
+            self._spilled.pop(path, None)
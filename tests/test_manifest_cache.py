@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests manifest expansion and the ManifestCache"""
+
+import copy
+import os
+import threading
+
+import pytest
+
+from cidc_ngs_pipeline_api import manifest_cache
+from cidc_ngs_pipeline_api import (
+    OUTPUT_APIS,
+    ManifestCache,
+    expand_manifest,
+    spec_hash,
+)
+
+
+RNA_BINDINGS = {"cimac id": "CTTTPP111.00"}
+WES_BINDINGS = {
+    "run id": "run1",
+    "tumor cimac id": "CTTTPP111.00",
+    "normal cimac id": "CTTTPP112.00",
+}
+
+
+def test_expand_manifest():
+    """Ensure every template is expanded with the given bindings"""
+    api = OUTPUT_APIS["wes"]
+    files = expand_manifest(api, WES_BINDINGS)
+
+    assert len(files) == sum(len(v) for v in api.values())
+    for f in files:
+        assert "{" not in f["file_path"]
+        if "{" in f["file_path_template"]:
+            assert f["file_path_template"] != f["file_path"]
+
+    with pytest.raises(KeyError, match="Unbound wildcard {normal cimac id}"):
+        expand_manifest(api, {"run id": "run1"})
+
+    # values are inserted verbatim, never substituted again
+    api = {"g": [{"file_path_template": "{a}/{b}"}]}
+    files = expand_manifest(api, {"a": "{b}", "b": "x{"})
+    assert files[0]["file_path"] == "{b}/x{"
+
+
+def test_cache_hit_skips_hashing_and_expansion(monkeypatch):
+    """Ensure a hit neither re-hashes the spec nor re-expands it"""
+    calls = {"spec_hash": 0, "expand_manifest": 0}
+
+    def counting(name):
+        func = getattr(manifest_cache, name)
+
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    for name in calls:
+        monkeypatch.setattr(manifest_cache, name, counting(name))
+
+    cache = ManifestCache()
+    for _ in range(10):
+        cache.get("wes", WES_BINDINGS)
+    assert calls == {"spec_hash": 1, "expand_manifest": 1}
+    assert cache.cache_info().hits == 9
+
+
+def test_cache_hits_and_copies():
+    """Ensure repeat lookups hit and callers cannot mutate cached entries"""
+    cache = ManifestCache(maxsize=4)
+    first = cache.get("rna", RNA_BINDINGS)
+    first[0]["file_path"] = "mutated"
+    second = cache.get("rna", dict(reversed(list(RNA_BINDINGS.items()))))
+
+    assert second == expand_manifest(OUTPUT_APIS["rna"], RNA_BINDINGS)
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+
+def test_cache_lru_eviction_and_spill(tmpdir):
+    """Ensure least recently used entries are evicted, spilled and read back"""
+    spill_dir = str(tmpdir.join("spill"))
+    cache = ManifestCache(maxsize=2, spill_dir=spill_dir)
+    for cimac_id in ["A", "B", "A", "C"]:
+        cache.get("rna", {"cimac id": cimac_id})
+
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (1, 3, 1, 2)
+    assert len(os.listdir(spill_dir)) == 1  # "B"
+
+    files = cache.get("rna", {"cimac id": "B"})
+    assert files == expand_manifest(OUTPUT_APIS["rna"], {"cimac id": "B"})
+    assert cache.cache_info().spill_hits == 1
+
+    tmpdir.join("spill", "unrelated.json").write("keep me")
+    cache.get("rna", {"cimac id": "D"})  # spills "A"
+    cache.clear()
+    assert cache.cache_info() == (0, 0, 0, 0, 2, 0)
+    assert os.listdir(spill_dir) == ["unrelated.json"]
+
+    no_spill = ManifestCache(maxsize=1)
+    no_spill.get("rna", {"cimac id": "A"})
+    no_spill.get("rna", {"cimac id": "B"})
+    no_spill.get("rna", {"cimac id": "A"})
+    assert no_spill.cache_info().misses == 3
+
+
+def test_cache_invalidated_on_spec_change(tmpdir):
+    """Ensure editing a spec in place drops the entries of its old content"""
+    api = copy.deepcopy(OUTPUT_APIS["rna"])
+    cache = ManifestCache(maxsize=1, spill_dir=str(tmpdir))
+    cache.get("rna", {"cimac id": "A"}, api=api)
+    cache.get("rna", {"cimac id": "B"}, api=api)  # spills "A"
+    assert len(tmpdir.listdir()) == 1
+
+    old_hash = spec_hash(api)
+    api["cimac id"][0]["file_path_template"] = "analysis/{cimac id}.new.yaml"
+    assert spec_hash(api) != old_hash
+
+    files = cache.get("rna", {"cimac id": "B"}, api=api)
+    assert files[0]["file_path"] == "analysis/B.new.yaml"
+    files = cache.get("rna", {"cimac id": "A"}, api=api)
+    assert files[0]["file_path"] == "analysis/A.new.yaml"
+    info = cache.cache_info()
+    assert (info.misses, info.spill_hits) == (4, 0)
+    assert len(tmpdir.listdir()) == 1  # the new "B"
+
+
+def test_cache_alternating_specs(tmpdir):
+    """Ensure specs with different content coexist rather than evict each other"""
+    new_api = copy.deepcopy(OUTPUT_APIS["rna"])
+    new_api["cimac id"][0]["optional"] = False
+    cache = ManifestCache(maxsize=4, spill_dir=str(tmpdir))
+    for _ in range(5):
+        cache.get("rna", RNA_BINDINGS)
+        cache.get("rna", RNA_BINDINGS, api=new_api)
+
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (8, 2, 2)
+
+
+def test_spill_shared_between_caches(tmpdir):
+    """Ensure a new cache reads back the spill files of an earlier one"""
+    first = ManifestCache(maxsize=1, spill_dir=str(tmpdir))
+    first.get("rna", {"cimac id": "A"})
+    first.get("rna", {"cimac id": "B"})  # spills "A"
+
+    second = ManifestCache(maxsize=1, spill_dir=str(tmpdir))
+    files = second.get("rna", {"cimac id": "A"})
+    assert files == expand_manifest(OUTPUT_APIS["rna"], {"cimac id": "A"})
+    assert second.cache_info().spill_hits == 1
+
+
+@pytest.mark.parametrize("content", ['{"key": ["rna", "', "[]", '{"key": 1}'])
+def test_spill_corrupt_file(tmpdir, content):
+    """Ensure a corrupt spill file is dropped and the manifest re-expanded"""
+    cache = ManifestCache(maxsize=1, spill_dir=str(tmpdir))
+    cache.get("rna", {"cimac id": "A"})
+    cache.get("rna", {"cimac id": "B"})  # spills "A"
+    (spilled,) = tmpdir.listdir()
+    spilled.write(content)
+
+    files = cache.get("rna", {"cimac id": "A"})
+    assert files == expand_manifest(OUTPUT_APIS["rna"], {"cimac id": "A"})
+    info = cache.cache_info()
+    assert (info.misses, info.spill_hits) == (3, 0)
+    assert spilled not in tmpdir.listdir()
+
+
+def test_spill_bounded(tmpdir):
+    """Ensure the spill tier keeps at most spill_maxsize files"""
+    cache = ManifestCache(maxsize=1, spill_dir=str(tmpdir), spill_maxsize=2)
+    for cimac_id in "ABCDE":
+        cache.get("rna", {"cimac id": cimac_id})
+    assert len(tmpdir.listdir()) == 2
+
+
+def test_spill_write_failure(tmpdir, monkeypatch):
+    """Ensure a failed spill write neither fails get nor leaves temp files"""
+
+    def replace(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(manifest_cache.os, "replace", replace)
+    cache = ManifestCache(maxsize=1, spill_dir=str(tmpdir))
+    cache.get("rna", {"cimac id": "A"})
+    files = cache.get("rna", {"cimac id": "B"})
+
+    assert files == expand_manifest(OUTPUT_APIS["rna"], {"cimac id": "B"})
+    assert cache.cache_info().evictions == 1
+    assert tmpdir.listdir() == []
+
+
+def test_cache_thread_safety():
+    """Ensure concurrent lookups are consistent and fully accounted for"""
+    cache = ManifestCache(maxsize=3)
+    ids = [str(i % 5) for i in range(200)]
+    errors = []
+
+    def worker(chunk):
+        for cimac_id in chunk:
+            files = cache.get("rna", {"cimac id": cimac_id})
+            expected = f"analysis/star/{cimac_id}/{cimac_id}.sorted.bam"
+            if files[1]["file_path"] != expected:
+                errors.append(cimac_id)
+
+    threads = [threading.Thread(target=worker, args=(ids[i::4],)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    info = cache.cache_info()
+    assert errors == []
+    assert info.hits + info.misses == len(ids)
+    assert info.currsize == 3
+
+
+def test_cache_thread_safety_with_spill(tmpdir):
+    """Ensure concurrent lookups through the spill tier are consistent"""
+    cache = ManifestCache(maxsize=2, spill_dir=str(tmpdir), spill_maxsize=3)
+    ids = [str(i % 7) for i in range(300)]
+    errors = []
+
+    def worker(chunk):
+        try:
+            for cimac_id in chunk:
+                files = cache.get("rna", {"cimac id": cimac_id})
+                expected = f"analysis/star/{cimac_id}/{cimac_id}.sorted.bam"
+                if files[1]["file_path"] != expected:
+                    errors.append(cimac_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(ids[i::4],)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    info = cache.cache_info()
+    assert errors == []
+    assert info.hits + info.misses + info.spill_hits == len(ids)
+    assert info.spill_hits > 0
+    assert not [p for p in tmpdir.listdir() if p.ext == ".tmp"]
+    assert len(tmpdir.listdir()) <= 3